@@ -1,4 +1,5 @@
-from pydantic_settings import BaseSettings
+from functools import lru_cache
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     """
@@ -14,8 +15,24 @@ class Settings(BaseSettings):
     MONGO_CONNECTION_STRING: str
     MONGO_DB_NAME: str
 
-    class Config:
-        env_file = ".env"
+    # MongoDB Connection Pool Settings
+    # Keeps a warm baseline of sockets so new viva sessions don't pay
+    # the TLS + auth handshake, and caps concurrent connection storms.
+    MONGO_MAX_POOL_SIZE: int = 200
+    MONGO_MIN_POOL_SIZE: int = 10
+    MONGO_MAX_IDLE_TIME_MS: int = 300000
+    MONGO_MAX_CONNECTING: int = 4
+
+    # Settings are read-only after startup
+    model_config = SettingsConfigDict(env_file=".env", frozen=True, extra="ignore")
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Returns the single Settings instance, parsing the environment
+    and .env file only on the first call.
+    """
+    return Settings()
 
 # Create a single instance to be imported by other modules
-settings = Settings()
\ No newline at end of file
+settings = get_settings()
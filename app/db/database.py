@@ -21,11 +21,22 @@ async def connect_to_database():
     print("--- DB: Connecting to MongoDB... ---")
     try:
         db.client = motor.motor_asyncio.AsyncIOMotorClient(
-            settings.MONGO_CONNECTION_STRING
+            settings.MONGO_CONNECTION_STRING,
+            maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+            maxConnecting=settings.MONGO_MAX_CONNECTING,
+            serverSelectionTimeoutMS=5000,
+            retryWrites=True
         )
         # Ping the server to verify connection
         await db.client.admin.command('ping') 
         db.db = db.client[settings.MONGO_DB_NAME]
+        # Ensure the indexes our queries rely on exist.
+        # History lookups filter by student_name and sort newest first (by _id).
+        await db.db["viva_sessions"].create_index(
+            [("student_name", 1), ("_id", -1)]
+        )
         print(f"--- DB: Connected to MongoDB, database: '{settings.MONGO_DB_NAME}' ---")
     except Exception as e:
         print(f"--- DB: FAILED to connect to MongoDB. Error: {e} ---")
@@ -3,8 +3,9 @@
 from pydantic import BaseModel, Field
 from pydantic_core import core_schema  # Correct import (unchanged)
 from typing import List, Optional, Any
-from datetime import datetime
+from datetime import datetime, timezone
 from bson import ObjectId
+from bson.errors import InvalidId
 
 
 class PyObjectId(ObjectId):
@@ -17,15 +18,18 @@ class PyObjectId(ObjectId):
         Accepts ObjectId instance or valid string, serializes to str.
         """
         
-        # Validator function (unchanged)
+        # Validator function: ObjectId() already rejects bad input,
+        # so we don't parse the hex string twice with is_valid() first.
         def validate_from_str(v: str) -> ObjectId:
-            if not ObjectId.is_valid(v):
-                raise ValueError("Invalid ObjectId")
-            return ObjectId(v)
+            try:
+                return ObjectId(v)
+            except (InvalidId, TypeError) as e:
+                raise ValueError("Invalid ObjectId") from e
 
         return core_schema.union_schema(
             [
-                # Schema 1: Check if it's already an ObjectId instance
+                # Schema 1: Check if it's already an ObjectId instance.
+                # This comes first so ObjectIds decoded by Motor skip string validation.
                 core_schema.is_instance_schema(ObjectId),
                 
                 # Schema 2: If not, try to validate it from a string
@@ -42,6 +46,11 @@ class PyObjectId(ObjectId):
         )
 
 
+def _utcnow() -> datetime:
+    """Timezone-aware replacement for the deprecated datetime.utcnow()."""
+    return datetime.now(timezone.utc)
+
+
 class LLMEvaluation(BaseModel):
     """
     A structured response from the LLM, containing both
@@ -50,14 +59,30 @@ class LLMEvaluation(BaseModel):
     evaluation: str = Field(description="AI's feedback on the student's last answer.")
     new_question: str = Field(description="AI's next question for the student.")
 
+    def to_bson(self) -> dict:
+        """Hand-rolled equivalent of model_dump(), for the DB write path."""
+        return {"evaluation": self.evaluation, "new_question": self.new_question}
+
 
 class Message(BaseModel):
     """A single message in the viva transcript."""
     speaker: str = Field(description="'ai' or 'user'")
     text: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=_utcnow)
     ai_evaluation: Optional[LLMEvaluation] = None  # Stores structured LLM output
 
+    def to_bson(self) -> dict:
+        """
+        Hand-rolled equivalent of model_dump(), for the transcript write path.
+        Skips Pydantic's serializer; the timestamp stays a native datetime.
+        """
+        return {
+            "speaker": self.speaker,
+            "text": self.text,
+            "timestamp": self.timestamp,
+            "ai_evaluation": self.ai_evaluation.to_bson() if self.ai_evaluation else None,
+        }
+
 
 class VivaSession(BaseModel):
     """
@@ -68,12 +93,20 @@ class VivaSession(BaseModel):
     topic: str
     class_level: str
     status: str = Field(default="active")  # e.g., "active", "completed"
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    transcript: List[Message] = Field(default_factory=list)
+    created_at: datetime = Field(default_factory=_utcnow)
+    # None means "no messages (yet)" or "projected out" - treat it as empty.
+    # Avoids allocating an empty list for every session in history listings.
+    transcript: Optional[List[Message]] = None
+
+    # Rolling LLM summary of the first 'summarized_message_count' messages,
+    # so a resumed viva can rebuild its bounded LLM history.
+    summary: Optional[str] = None
+    summarized_message_count: int = 0
 
-    # Pydantic V2 Config (unchanged from previous fix)
+    # Pydantic V2 Config
+    # ObjectId -> str serialization is handled by PyObjectId's core schema,
+    # so no (deprecated) 'json_encoders' entry is needed here.
     model_config = {
         "populate_by_name": True,  # Replaces 'allow_population_by_field_name'
         "arbitrary_types_allowed": True,  # Required for PyObjectId to work
-        "json_encoders": {ObjectId: str}  # Handles ObjectId -> str serialization
     }
\ No newline at end of file
@@ -8,11 +8,13 @@ from fastapi import (
     status
 )
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+from typing import AsyncIterator, List
 import asyncio
 import json
-from contextlib import asynccontextmanager
+import logging
+from contextlib import aclosing, asynccontextmanager
 
 # FIXED: Import functions separately + the db instance
 from app.db.database import db as mongo_db, connect_to_database, close_database_connection  # <-- ADD FUNCTIONS
@@ -20,6 +22,10 @@ from app.services.session_service import SessionService, get_session_service
 from app.services.orchestrator import VivaOrchestrator
 from app.db.models import VivaSession
 
+# Production runs at INFO, so per-frame debug logs are never formatted
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 # --- Database Lifecycle (UNCHANGED) ---
 
 @asynccontextmanager
@@ -56,8 +62,9 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
-    allow_methods=["*"], # Allows all methods (GET, POST, etc.)
-    allow_headers=["*"], # Allows all headers
+    allow_methods=["GET", "POST"], # The only methods our API uses
+    allow_headers=["Content-Type", "Authorization"],
+    max_age=86400, # Let browsers cache preflight responses for 24h
 )
 
 # --- HTTP Endpoints (UNCHANGED) ---
@@ -88,17 +95,108 @@ async def start_viva(
     )
     return VivaStartResponse(session_id=session_id)
 
-@app.get("/viva-history", response_model=List[VivaSession])
+# Built once: serializes the history straight to JSON bytes, without
+# FastAPI re-validating the (already validated) sessions on every request.
+_HISTORY_ADAPTER = TypeAdapter(List[VivaSession])
+# Resume state for the orchestrator, not part of the history API.
+# (summarized_message_count has a default, so exclude_none wouldn't drop it.)
+_HISTORY_EXCLUDE = {"__all__": {"summary", "summarized_message_count"}}
+
+@app.get(
+    "/viva-history",
+    response_model=None,
+    responses={200: {"model": List[VivaSession]}}
+)
 async def get_history(
     student_name: str,
     service: SessionService = Depends(get_session_service)
-):
+) -> Response:
     """
     HTTP endpoint to get all past viva sessions for a specific student.
     """
-    return await service.get_viva_history_for_user(student_name)
+    sessions = await service.get_viva_history_for_user(student_name)
+    return Response(
+        content=_HISTORY_ADAPTER.dump_json(
+            sessions, by_alias=True, exclude_none=True, exclude=_HISTORY_EXCLUDE
+        ),
+        media_type="application/json"
+    )
+
+# --- WebSocket Endpoint ---
 
-# --- WebSocket Endpoint (UNCHANGED) ---
+# Client audio frames are coalesced for up to this long (or this many bytes)
+# before being forwarded, so we pay one ASR send per batch, not per frame.
+AUDIO_BATCH_WINDOW_S = 0.02
+AUDIO_BATCH_MAX_BYTES = 8192
+
+async def _receive_audio_frames(websocket: WebSocket, frames: asyncio.Queue):
+    """
+    Reads every message from the client and queues its audio frame.
+    Text (control) frames are skipped, so they can't end the viva.
+    When the client goes away, the WebSocketDisconnect (or any other
+    error) is queued instead, for iter_audio_batches to raise.
+    """
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+            # Only binary frames carry audio
+            if message.get("bytes"):
+                frames.put_nowait(message["bytes"])
+    except Exception as e:
+        frames.put_nowait(e)
+
+async def iter_audio_batches(websocket: WebSocket) -> AsyncIterator[bytes]:
+    """
+    Receives audio frames from the client and yields them in batches.
+    A batch is flushed once AUDIO_BATCH_WINDOW_S has passed since its first
+    frame, or once it reaches AUDIO_BATCH_MAX_BYTES.
+    Raises WebSocketDisconnect when the client goes away.
+    """
+    # One long-lived task receives from the socket, and we wait on its queue
+    # with a deadline. Wrapping each receive() in wait_for instead would
+    # create a task per frame and cancel one at every batch deadline, which
+    # can drop a frame that arrives just as the timeout fires. Queue.get()
+    # is safe to cancel (the frame stays queued), and asyncio.timeout_at
+    # doesn't create a task, so frames that are already queued cost no
+    # extra event-loop hop.
+    loop = asyncio.get_running_loop()
+    frames: asyncio.Queue = asyncio.Queue()
+    receiver = asyncio.create_task(_receive_audio_frames(websocket, frames))
+    buffer = bytearray()
+    deadline = None
+
+    try:
+        while True:
+            # Block indefinitely while idle; otherwise wait only until the deadline
+            if deadline is None:
+                frame = await frames.get()
+            else:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        frame = await frames.get()
+                except TimeoutError:
+                    frame = None
+
+            if isinstance(frame, Exception):
+                raise frame
+
+            if frame is not None:
+                if not buffer:
+                    deadline = loop.time() + AUDIO_BATCH_WINDOW_S
+                buffer += frame
+
+            if buffer and (
+                frame is None
+                or len(buffer) >= AUDIO_BATCH_MAX_BYTES
+                or loop.time() >= deadline
+            ):
+                yield bytes(buffer)
+                buffer.clear()
+                deadline = None
+    finally:
+        receiver.cancel()
 
 @app.websocket("/ws/viva/{session_id}")
 async def websocket_viva_endpoint(
@@ -126,24 +224,18 @@ async def websocket_viva_endpoint(
         # 3. Get the first question and stream it to the client
         await orchestrator.start_viva()
 
-        # 4. Enter the main loop: listen for audio from the client
-        while True:
-            data = await websocket.receive()
-            
-            if isinstance(data, bytes):
-                print(f"--- Main: Received {len(data)} audio bytes ---")
-                await orchestrator.handle_audio_chunk(data)
-            
-            elif isinstance(data, str):
-                # Handle text-based control messages if needed
-                print(f"--- Main: Received text message: {data} ---")
-                pass
+        # 4. Enter the main loop: listen for (batched) audio from the client
+        #    (aclosing stops the batcher's receiver task as soon as we leave)
+        async with aclosing(iter_audio_batches(websocket)) as audio_batches:
+            async for audio_batch in audio_batches:
+                logger.debug("--- Main: Received %d audio bytes ---", len(audio_batch))
+                await orchestrator.handle_audio_chunk(audio_batch)
 
     except WebSocketDisconnect:
-        print(f"--- Main: Client disconnected from session {session_id} ---")
+        logger.info("--- Main: Client disconnected from session %s ---", session_id)
     
     except Exception as e:
-        print(f"--- Main: An error occurred in session {session_id}: {e} ---")
+        logger.error("--- Main: An error occurred in session %s: %s ---", session_id, e)
         await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
     
     finally:
@@ -1,14 +1,18 @@
 # app/services/gemini_llm_service.py
 
-from typing import List
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from app.config import settings
-from app.db.models import LLMEvaluation, Message
+from app.db.models import LLMEvaluation
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from pydantic import BaseModel, Field
 
+logger = logging.getLogger(__name__)
+
 # --- 1. Define the LLM and Output Structure ---
 
 # We define the Pydantic model *again* for LangChain's parser
@@ -17,16 +21,35 @@ class LLMEvaluationOutput(BaseModel):
     evaluation: str = Field(description="AI's feedback on the student's last answer. Be concise and constructive.")
     new_question: str = Field(description="AI's next question for the student. The question should be relevant to the topic and the last answer.")
 
+# The JSON fields in the order the LLM generates them
+OUTPUT_FIELDS = ("evaluation", "new_question")
+
+# Called with (field_name, sentence) as soon as a sentence is fully generated
+SentenceCallback = Callable[[str, str], Awaitable[None]]
+
+# A sentence ends at ., ? or ! followed by whitespace (so "3.14" isn't split,
+# and we never split on the final, possibly still-growing, character)
+_SENTENCE_END = re.compile(r"[.?!]+(?=\s)")
+
 # Initialize the LLM
-# We use .with_structured_output to make JSON parsing reliable
+# We don't use .with_structured_output here: it only returns once the whole
+# response is generated. Instead the JSON parser below streams partial
+# output, so callers can start TTS before the LLM has finished.
 llm = ChatGoogleGenerativeAI(
     # Use a stable model identifier available in your environment
     model="gemini-2.5-flash",
     google_api_key=settings.GOOGLE_API_KEY,
     temperature=0.7
-).with_structured_output(LLMEvaluationOutput)
+)
 
-# Initialize the JSON parser (kept for clarity)
+# A cheaper, deterministic model for condensing older parts of the transcript
+summary_llm = ChatGoogleGenerativeAI(
+    model="gemini-2.5-flash-lite",
+    google_api_key=settings.GOOGLE_API_KEY,
+    temperature=0
+)
+
+# Initialize the JSON parser (parses partial JSON while streaming)
 parser = JsonOutputParser(pydantic_object=LLMEvaluationOutput)
 
 # --- 2. Prompt Templates ---
@@ -63,91 +86,181 @@ Provide your response ONLY in the following JSON format.
 {format_instructions}
 """
 
-# --- 3. Helper Function to Format History ---
+SUMMARY_PROMPT = """
+You are summarizing part of a verbal viva (oral exam) for the examiner.
 
-def format_history(history: List[Message]) -> str:
-    """Converts the list of Message objects into a string for the LLM."""
-    if not history:
-        return "No history yet."
-    
-    formatted = []
-    for msg in history:
-        if msg.speaker == "ai":
-            formatted.append(f"AI Examiner: {msg.text}")
-        else:
-            formatted.append(f"Student: {msg.text}")
-    return "\n".join(formatted)
+Summary of the viva so far:
+{previous_summary}
+
+Newer part of the transcript:
+{transcript}
+
+Write an updated, concise summary covering both: which questions were asked,
+how well the student answered each, and any gaps in their understanding.
+Respond with the summary text only.
+"""
+
+# --- 3. Pre-built Chains ---
+
+# Build the prompt templates and chains once at import time, so each
+# viva turn only pays for the LLM call itself.
+_FORMAT_INSTRUCTIONS = parser.get_format_instructions()
+
+_FIRST_CHAIN = ChatPromptTemplate.from_template(
+    template=FIRST_QUESTION_PROMPT,
+    partial_variables={"format_instructions": _FORMAT_INSTRUCTIONS}
+) | llm | parser
+
+_EVAL_CHAIN = ChatPromptTemplate.from_template(
+    template=EVALUATION_PROMPT,
+    partial_variables={"format_instructions": _FORMAT_INSTRUCTIONS}
+) | llm | parser
+
+_SUMMARY_CHAIN = ChatPromptTemplate.from_template(
+    template=SUMMARY_PROMPT
+) | summary_llm | StrOutputParser()
+
+# --- 4. Helper Function to Format History Lines ---
+
+def format_history_line(speaker: str, text: str) -> str:
+    """
+    Converts a single transcript message into a line for the LLM.
+    Callers append these lines to a running buffer as the viva progresses,
+    so the full transcript is never re-formatted on each turn.
+    """
+    if speaker == "ai":
+        return f"AI Examiner: {text}"
+    return f"Student: {text}"
+
+# --- 5. Streaming Helpers ---
+
+async def _run_chain(
+    chain: Any,
+    inputs: Dict[str, str],
+    on_sentence: Optional[SentenceCallback] = None
+) -> LLMEvaluationOutput:
+    """
+    Runs a chain in streaming mode and returns the validated final output.
+    While the partial JSON streams in, 'on_sentence' is called with each
+    completed sentence of each field, so TTS can start on the first one.
+    A field is complete once the next field has started, or the stream ends.
+    Raises ValueError if the final output is incomplete or has no question.
+    """
+    partial: Dict[str, Any] = {}
+    field_index = 0
+    spoken = 0  # Characters of the current field already passed to on_sentence
+
+    async def emit(name: str, text: str):
+        if on_sentence and text.strip():
+            await on_sentence(name, text.strip())
+
+    async for partial in chain.astream(inputs):
+        if not isinstance(partial, dict):
+            continue
+
+        while field_index < len(OUTPUT_FIELDS):
+            name = OUTPUT_FIELDS[field_index]
+            text = str(partial.get(name, ""))
+            is_complete = (
+                name in partial
+                and field_index + 1 < len(OUTPUT_FIELDS)
+                and OUTPUT_FIELDS[field_index + 1] in partial
+            )
 
-# --- 4. Main Service Functions (Called by Orchestrator) ---
+            if is_complete:
+                await emit(name, text[spoken:])
+                field_index += 1
+                spoken = 0
+                continue
 
-async def get_ai_first_question(topic: str, class_level: str) -> LLMEvaluation:
+            # Emit everything up to the last finished sentence seen so far
+            boundaries = list(_SENTENCE_END.finditer(text, spoken))
+            if boundaries:
+                end = boundaries[-1].end()
+                await emit(name, text[spoken:end])
+                spoken = end
+            break
+
+    # The stream has ended, so whatever is left of each field is complete
+    for name in OUTPUT_FIELDS[field_index:]:
+        await emit(name, str(partial.get(name, ""))[spoken:])
+        spoken = 0
+
+    # The streaming parser never raises: output that isn't JSON yields
+    # nothing, and truncated JSON yields a partial dict. Validate the final
+    # result here, so a bad response fails the turn instead of being saved.
+    output = LLMEvaluationOutput.model_validate(partial)
+    if not output.new_question.strip():
+        raise ValueError("LLM response has an empty 'new_question'")
+    return output
+
+# --- 6. Main Service Functions (Called by Orchestrator) ---
+
+async def get_ai_first_question(
+    topic: str, 
+    class_level: str,
+    on_sentence: Optional[SentenceCallback] = None
+) -> LLMEvaluation:
     """
     Gets the initial question from the LLM.
+    'on_sentence' is called for each sentence as soon as it is generated.
     """
-    print(f"--- LLM Service: Getting first question for topic: {topic} ---")
+    logger.debug("--- LLM Service: Getting first question for topic: %s ---", topic)
     
-    prompt_template = ChatPromptTemplate.from_template(
-        template=FIRST_QUESTION_PROMPT,
-        partial_variables={"format_instructions": parser.get_format_instructions()}
-    )
-    
-    chain = prompt_template | llm
-    
-    # We use .ainvoke() for an async call
-    response_model: LLMEvaluationOutput = await chain.ainvoke({
+    # We stream the response so the question is available as early as possible
+    output = await _run_chain(_FIRST_CHAIN, {
         "topic": topic,
         "class_level": class_level
-    })
+    }, on_sentence)
     
-    # In the first question, there is no "evaluation", so we provide a short placeholder.
-    response_model.evaluation = "Let's begin."
-    
-    print(f"--- LLM Service: Got first question: {response_model.new_question[:60]}... ---")
+    logger.debug("--- LLM Service: Got first question: %.60s... ---", output.new_question)
     
-    # Convert from LangChain's Pydantic model to our app's Pydantic model
-    # IMPORTANT: convert to a plain dict first to satisfy model_validate's input expectations.
-    try:
-        response_dict = response_model.model_dump()
-        return LLMEvaluation.model_validate(response_dict)
-    except Exception as e:
-        # Provide clear logs for debugging if validation fails
-        print(f"--- LLM Service: Error validating first question response! {e} ---")
-        raise
+    # Convert the output to our app's Pydantic model.
+    # In the first question, there is no "evaluation", so we provide a short placeholder.
+    return LLMEvaluation(
+        evaluation="Let's begin.",
+        new_question=output.new_question
+    )
 
 async def get_ai_evaluation(
     topic: str, 
     class_level: str, 
-    history: List[Message], 
-    student_answer: str
+    history: str, 
+    student_answer: str,
+    on_sentence: Optional[SentenceCallback] = None
 ) -> LLMEvaluation:
     """
     Gets an evaluation and the next question from the LLM.
+    'history' is the pre-formatted transcript (see format_history_line).
+    'on_sentence' is called for each sentence as soon as it is generated.
     """
-    print(f"--- LLM Service: Evaluating answer: {student_answer[:60]}... ---")
-    
-    prompt_template = ChatPromptTemplate.from_template(
-        template=EVALUATION_PROMPT,
-        partial_variables={"format_instructions": parser.get_format_instructions()}
-    )
-    
-    chain = prompt_template | llm
+    logger.debug("--- LLM Service: Evaluating answer: %.60s... ---", student_answer)
     
-    formatted_history = format_history(history)
-    
-    response_model: LLMEvaluationOutput = await chain.ainvoke({
+    output = await _run_chain(_EVAL_CHAIN, {
         "topic": topic,
         "class_level": class_level,
-        "history": formatted_history,
+        "history": history or "No history yet.",
         "student_answer": student_answer
-    })
+    }, on_sentence)
     
-    print(f"--- LLM Service: Got evaluation: {response_model.evaluation[:60]}... ---")
-    print(f"--- LLM Service: Got next question: {response_model.new_question[:60]}... ---")
-
-    # Convert from LangChain's Pydantic model to our app's Pydantic model
-    try:
-        response_dict = response_model.model_dump()
-        return LLMEvaluation.model_validate(response_dict)
-    except Exception as e:
-        print(f"--- LLM Service: Error validating evaluation response! {e} ---")
-        raise
\ No newline at end of file
+    logger.debug("--- LLM Service: Got evaluation: %.60s... ---", output.evaluation)
+    logger.debug("--- LLM Service: Got next question: %.60s... ---", output.new_question)
+
+    # Convert the output to our app's Pydantic model
+    return LLMEvaluation(
+        evaluation=output.evaluation,
+        new_question=output.new_question
+    )
+
+async def summarize_history(previous_summary: str, lines: List[str]) -> str:
+    """
+    Condenses older transcript lines (see format_history_line) into the
+    running summary, so the evaluation prompt stays bounded in size.
+    """
+    logger.debug("--- LLM Service: Summarizing %d transcript line(s) ---", len(lines))
+
+    summary = await _SUMMARY_CHAIN.ainvoke({
+        "previous_summary": previous_summary or "Nothing yet.",
+        "transcript": "\n".join(lines)
+    })
+    return summary.strip()
\ No newline at end of file
@@ -1,12 +1,51 @@
 import asyncio
+import logging
+import orjson
+from collections import deque
+from contextlib import aclosing
+from functools import partial
+from typing import Awaitable, Callable, Iterable
 from fastapi import WebSocket
 from bson import ObjectId
 
 from app.db.database import get_db
 from app.db.models import VivaSession, Message, LLMEvaluation
 from app.services.sarvam_asr_service import SarvamASRService
-from app.services.gemini_llm_service import get_ai_evaluation, get_ai_first_question
-from app.services.sarvam_tts_service import text_to_audio_stream
+from app.services.gemini_llm_service import (
+    get_ai_evaluation,
+    get_ai_first_question,
+    format_history_line,
+    summarize_history
+)
+from app.services.sarvam_tts_service import SarvamTTSService
+
+logger = logging.getLogger(__name__)
+
+# Static control messages for the client, encoded once
+SPEECH_END_MSG = orjson.dumps({"type": "speech_end"}).decode()
+
+# Transcript messages are queued and written to MongoDB in one $push per
+# flush, at most this often, instead of one round trip per message.
+TRANSCRIPT_FLUSH_INTERVAL_S = 1.0
+
+# TTS audio chunks waiting to be sent to the client. The queue is bounded so
+# a slow client applies backpressure to TTS, and whatever has piled up is
+# coalesced into WebSocket frames of up to AUDIO_SEND_MAX_BYTES.
+AUDIO_SEND_QUEUE_SIZE = 8
+AUDIO_SEND_MAX_BYTES = 32 * 1024
+
+# Client audio waiting to be forwarded to ASR. Audio is also held here while
+# an LLM turn is in progress (but not while the AI is speaking, see
+# handle_audio_chunk). Mic input is real-time, so when the queue is full we
+# drop the oldest audio instead of letting memory (and latency) grow without
+# bound.
+ASR_AUDIO_QUEUE_SIZE = 32
+
+# The LLM sees only the last HISTORY_WINDOW_SIZE messages verbatim, plus a
+# rolling summary of everything older. Messages that fall out of the window
+# are folded into the summary once SUMMARIZE_EVERY_N_MESSAGES have piled up.
+HISTORY_WINDOW_SIZE = 6
+SUMMARIZE_EVERY_N_MESSAGES = 6
 
 class VivaOrchestrator:
     """
@@ -15,19 +54,49 @@ class VivaOrchestrator:
     1. Initializes all services (ASR, LLM, TTS).
     2. Handles the bi-directional audio stream with the client.
     3. Orchestrates the flow: User Audio -> ASR -> LLM -> TTS -> Client Audio.
-    4. Updates the database with the transcript in real-time.
+    4. Updates the database with the transcript, off the critical path:
+       messages are queued and flushed in the background, so neither the
+       LLM call nor TTS streaming ever waits on a MongoDB write.
     """
 
     def __init__(self, client_ws: WebSocket, session_id: str):
         self.client_ws = client_ws
         self.session_id = session_id
+        # The parsed session _id and the filter for every update we make.
+        # Built once in initialize(), where an invalid id is handled.
+        self._session_filter: dict | None = None
         self.db = None
         self.session_collection = None
         self.viva_session: VivaSession | None = None
 
+        # The LLM history: recent messages pre-formatted one line each, older
+        # lines not yet summarized, and the rolling summary of the rest
+        self._recent_history: deque[str] = deque(maxlen=HISTORY_WINDOW_SIZE)
+        self._unsummarized_history: list[str] = []
+        self._summary = ""
+        self._summarized_count = 0
+        self._summary_task: asyncio.Task | None = None
+
+        # Transcript messages (and other fields) waiting to be written to MongoDB
+        self._pending_messages: list[dict] = []
+        self._pending_fields: dict = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+
         # Initialize our stateful ASR service
         self.asr_service = SarvamASRService(on_transcript=self.on_transcript_received)
-        self.is_processing_llm = False  # A "lock" to prevent concurrent LLM calls
+
+        # One persistent TTS connection, reused for every AI turn
+        self.tts_service = SarvamTTSService()
+
+        # Client audio is forwarded to ASR by a dedicated task, which waits
+        # on this event (cleared during LLM turns) before each send
+        self._audio_queue: asyncio.Queue = asyncio.Queue(maxsize=ASR_AUDIO_QUEUE_SIZE)
+        self._asr_forwarding_allowed = asyncio.Event()
+        self._asr_forwarding_allowed.set()
+        self._asr_forwarder_task: asyncio.Task | None = None
+        # True while AI audio is being sent to the client (see handle_audio_chunk)
+        self._is_ai_speaking = False
 
     async def initialize(self):
         """
@@ -35,6 +104,8 @@ class VivaOrchestrator:
         Returns True on success, False on failure.
         """
         try:
+            self._session_filter = {"_id": ObjectId(self.session_id)}
+
             self.db = await get_db()
             self.session_collection = self.db["viva_sessions"]
 
@@ -42,7 +113,7 @@ class VivaOrchestrator:
                 raise RuntimeError("MongoDB collection not initialized.")
 
             # Fetch the session from MongoDB
-            session_data = await self.session_collection.find_one({"_id": ObjectId(self.session_id)})
+            session_data = await self.session_collection.find_one(self._session_filter)
 
             if not session_data:
                 print(f"--- Orchestrator: Error! Session {self.session_id} not found. ---")
@@ -50,8 +121,33 @@ class VivaOrchestrator:
 
             self.viva_session = VivaSession.model_validate(session_data)
 
-            # Connect ASR service
-            await self.asr_service.connect()
+            # Rebuild the LLM history once, in case we are resuming a viva
+            self._summary = self.viva_session.summary or ""
+            self._summarized_count = self.viva_session.summarized_message_count
+            for message in (self.viva_session.transcript or [])[self._summarized_count:]:
+                self._append_to_history(message)
+
+            # Nothing after this point reads the loaded messages (the LLM
+            # history above is bounded, and MongoDB has the full transcript),
+            # so don't keep a growing copy of the transcript in memory
+            self.viva_session.transcript = None
+
+            # Connect ASR and TTS services (independent, so in parallel).
+            # If either fails, close both so nothing is left connected.
+            results = await asyncio.gather(
+                self.asr_service.connect(),
+                self.tts_service.connect(),
+                return_exceptions=True
+            )
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                await self.tts_service.close()
+                await self.asr_service.close()
+                raise errors[0]
+
+            # Start the background tasks: ASR audio forwarding, transcript writes
+            self._asr_forwarder_task = asyncio.create_task(self._forward_audio_to_asr())
+            self._flush_task = asyncio.create_task(self._flush_transcript_periodically())
 
             return True
 
@@ -66,34 +162,65 @@ class VivaOrchestrator:
         if not self.viva_session:
             return
 
-        if len(self.viva_session.transcript) > 0:
+        # The history window always holds the latest messages (only older
+        # ones are summarized), so it is empty only for a new viva
+        if self._recent_history:
             print("--- Orchestrator: Resuming viva. Waiting for user audio. ---")
             return
 
         print(f"--- Orchestrator: Starting new viva for topic: {self.viva_session.topic} ---")
 
-        # 1. Get the first question from the LLM
-        llm_response = await get_ai_first_question(
-            topic=self.viva_session.topic,
-            class_level=self.viva_session.class_level
+        # 1. Get the first question from the LLM, streaming it to TTS
+        #    as soon as it is generated. Only the question is spoken.
+        llm_response, speaker_task = await self.get_llm_response_while_speaking(
+            partial(
+                get_ai_first_question,
+                topic=self.viva_session.topic,
+                class_level=self.viva_session.class_level
+            ),
+            spoken_fields=("new_question",)
         )
 
         # 2. Save the first AI message to DB
-        ai_message = await self.save_message_to_db(
+        self.save_message_to_db(
             speaker="ai",
             text=llm_response.new_question,
             evaluation=llm_response
         )
 
-        # 3. Stream the question audio to the client
-        await self.stream_ai_audio_to_client(ai_message)
+        # 3. Wait for the question audio to finish streaming to the client
+        await speaker_task
 
     async def handle_audio_chunk(self, audio_chunk: bytes):
         """
         Receives raw audio chunks from the client's WebSocket.
+        Audio that arrives during an LLM turn is held (not dropped), so the
+        start of the student's next answer still reaches ASR afterwards.
+        Audio that arrives while the AI is speaking is dropped instead: the
+        mic picks up the AI's own voice, and replaying that into ASR once
+        the turn ends would be transcribed as the student's answer. (The
+        client plays audio slightly behind us, so it still needs its own
+        echo cancellation for the tail of each utterance.)
+        """
+        if self._is_ai_speaking:
+            logger.debug("--- Orchestrator: AI is speaking, dropping %d audio bytes ---", len(audio_chunk))
+            return
+
+        if self.asr_service:
+            try:
+                self._audio_queue.put_nowait(audio_chunk)
+            except asyncio.QueueFull:
+                # ASR is falling behind: stale audio is useless, drop the oldest
+                self._audio_queue.get_nowait()
+                self._audio_queue.put_nowait(audio_chunk)
+
+    async def _forward_audio_to_asr(self):
         """
-        print(f"--- Orchestrator: Handling audio chunk. is_processing_llm = {self.is_processing_llm} ---")
-        if self.asr_service and not self.is_processing_llm:
+        A long-running task that sends queued client audio to the ASR service.
+        """
+        while True:
+            audio_chunk = await self._audio_queue.get()
+            await self._asr_forwarding_allowed.wait()
             await self.asr_service.send_audio_chunk(audio_chunk)
 
     async def on_transcript_received(self, transcript: str):
@@ -104,89 +231,307 @@ class VivaOrchestrator:
             return
 
         try:
-            self.is_processing_llm = True
-
-            # 1. Save user's transcript
-            await self.save_message_to_db(speaker="user", text=transcript)
-
-            # 2. Get AI evaluation
-            llm_response = await get_ai_evaluation(
-                topic=self.viva_session.topic,
-                class_level=self.viva_session.class_level,
-                history=self.viva_session.transcript,
-                student_answer=transcript
+            self._asr_forwarding_allowed.clear()
+
+            # 1. Save user's transcript. This only queues the DB write,
+            #    so the LLM call below doesn't wait on MongoDB.
+            self.save_message_to_db(speaker="user", text=transcript)
+
+            # 2. Get AI evaluation, streaming each part to TTS as it is generated
+            llm_response, speaker_task = await self.get_llm_response_while_speaking(
+                partial(
+                    get_ai_evaluation,
+                    topic=self.viva_session.topic,
+                    class_level=self.viva_session.class_level,
+                    history=self._rolling_history(),
+                    student_answer=transcript
+                ),
+                spoken_fields=("evaluation", "new_question")
             )
 
             # 3. Save AI response
-            ai_message = await self.save_message_to_db(
+            self.save_message_to_db(
                 speaker="ai",
                 text=f"{llm_response.evaluation} {llm_response.new_question}",
                 evaluation=llm_response
             )
 
-            # 4. Stream AI response as audio
-            await self.stream_ai_audio_to_client(ai_message)
+            # 4. Wait for the AI response audio to finish streaming
+            await speaker_task
 
         except Exception as e:
             print(f"--- Orchestrator: Error in viva loop! {e} ---")
 
         finally:
-            self.is_processing_llm = False
+            # Release any audio held during this turn to ASR
+            self._asr_forwarding_allowed.set()
 
-    async def stream_ai_audio_to_client(self, ai_message: Message):
+    async def get_llm_response_while_speaking(
+        self,
+        llm_call: Callable[..., Awaitable[LLMEvaluation]],
+        spoken_fields: Iterable[str]
+    ) -> tuple[LLMEvaluation, asyncio.Task]:
+        """
+        Runs an LLM call and pushes each sentence of its 'spoken_fields' to
+        TTS as soon as that sentence is generated, overlapping speech with the
+        rest of the generation. Returns the LLM response and the still-running
+        speaker task.
+        """
+        segments: asyncio.Queue = asyncio.Queue()
+        speaker_task = asyncio.create_task(self.stream_ai_audio_to_client(segments))
+
+        async def on_sentence(name: str, sentence: str):
+            if name in spoken_fields:
+                segments.put_nowait(sentence)
+
+        try:
+            llm_response = await llm_call(on_sentence=on_sentence)
+        except BaseException:
+            # Also on cancellation (e.g. the client disconnected mid-turn),
+            # otherwise the speaker would wait on 'segments' forever
+            speaker_task.cancel()
+            raise
+
+        # Tell the speaker there is nothing more to say
+        segments.put_nowait(None)
+        return llm_response, speaker_task
+
+    async def stream_ai_audio_to_client(self, segments: asyncio.Queue):
         """
         Streams AI's audio response to the client via WebSocket.
+        Speaks each text segment from the queue in order, until a None
+        sentinel is received.
         """
-        print(f"--- Orchestrator: Streaming AI audio to client... ---")
+        logger.debug("--- Orchestrator: Streaming AI audio to client... ---")
 
-        audio_stream = text_to_audio_stream(text=ai_message.text)
+        audio_queue: asyncio.Queue = asyncio.Queue(maxsize=AUDIO_SEND_QUEUE_SIZE)
+        producer_task = asyncio.create_task(self._synthesize_segments(segments, audio_queue))
 
-        async for audio_chunk in audio_stream:
-            await self.client_ws.send_bytes(audio_chunk)
+        try:
+            await self._send_audio_from_queue(audio_queue)
 
-        await self.client_ws.send_json({"type": "speech_end"})
-        print("--- Orchestrator: Finished streaming AI audio. ---")
+            # Only signal the end once every queued chunk has been sent
+            await self.client_ws.send_text(SPEECH_END_MSG)
+        finally:
+            producer_task.cancel()
+            self._is_ai_speaking = False
+
+        logger.debug("--- Orchestrator: Finished streaming AI audio. ---")
 
-    async def save_message_to_db(
+    async def _synthesize_segments(self, segments: asyncio.Queue, audio_queue: asyncio.Queue):
+        """
+        Converts each text segment to audio and puts the chunks on
+        'audio_queue', followed by a None sentinel.
+        """
+        async def iter_segments():
+            while (text := await segments.get()) is not None:
+                yield text
+
+        cancelled = False
+        try:
+            # aclosing() releases the TTS connection as soon as we stop,
+            # rather than whenever the generator is garbage collected
+            async with aclosing(self.tts_service.text_to_audio_stream(texts=iter_segments())) as audio_stream:
+                async for audio_chunk in audio_stream:
+                    await audio_queue.put(audio_chunk)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # When cancelled, the sender has already exited: nobody will read
+            # the sentinel, and waiting for space in a full queue would hang
+            if not cancelled:
+                await audio_queue.put(None)
+
+    async def _send_audio_from_queue(self, audio_queue: asyncio.Queue):
+        """
+        Sends queued audio chunks to the client until the None sentinel.
+        Chunks that are already waiting are joined into a single frame.
+        """
+        finished = False
+        while not finished:
+            audio_chunk = await audio_queue.get()
+            if audio_chunk is None:
+                break
+
+            batch = [audio_chunk]
+            batch_size = len(audio_chunk)
+            while batch_size < AUDIO_SEND_MAX_BYTES and not audio_queue.empty():
+                audio_chunk = audio_queue.get_nowait()
+                if audio_chunk is None:
+                    finished = True
+                    break
+                batch.append(audio_chunk)
+                batch_size += len(audio_chunk)
+
+            self._is_ai_speaking = True
+            await self.client_ws.send_bytes(b"".join(batch))
+
+    def save_message_to_db(
         self,
         speaker: str,
         text: str,
         evaluation: LLMEvaluation = None
     ) -> Message:
         """
-        Creates and saves a Message to MongoDB and local transcript.
+        Creates a Message, adds it to the LLM history and queues it
+        for MongoDB. The write happens on the next transcript flush.
+        """
+        message = self.add_message_to_transcript(speaker, text, evaluation)
+        self.queue_message_for_db(message)
+        return message
+
+    def add_message_to_transcript(
+        self,
+        speaker: str,
+        text: str,
+        evaluation: LLMEvaluation = None
+    ) -> Message:
+        """
+        Creates a Message and adds it to the LLM history only.
+        The caller is responsible for persisting it (see queue_message_for_db).
         """
         if self.session_collection is None or self.viva_session is None:
             raise Exception("Database or session not initialized")
 
-        message = Message(
+        # All fields come from our own code as plain strings (or an already
+        # built LLMEvaluation), so skip validation. Defaults such as the
+        # timestamp are still filled in by model_construct.
+        message = Message.model_construct(
             speaker=speaker,
             text=text,
             ai_evaluation=evaluation
         )
 
-        self.viva_session.transcript.append(message)
+        self._append_to_history(message)
+        return message
 
-        await self.session_collection.update_one(
-            {"_id": ObjectId(self.session_id)},
-            {"$push": {"transcript": message.model_dump()}}
-        )
+    def queue_message_for_db(self, message: Message):
+        """
+        Queues an already-created Message to be written to MongoDB.
+        """
+        # to_bson() keeps the timestamp a datetime, stored as a native BSON date
+        self._pending_messages.append(message.to_bson())
 
-        print(f"--- Orchestrator: Saved message to DB: '{text[:30]}...' ---")
-        return message
+    async def flush_transcript(self, set_fields: dict | None = None):
+        """
+        Writes all queued transcript messages to MongoDB in a single update.
+        Queued fields and any 'set_fields' are $set in that same update,
+        saving a round trip.
+        """
+        async with self._flush_lock:
+            if not self._pending_messages and not self._pending_fields and not set_fields:
+                return
+
+            pending, self._pending_messages = self._pending_messages, []
+            queued_fields, self._pending_fields = self._pending_fields, {}
+            fields = {**queued_fields, **(set_fields or {})}
+
+            # Append only the new messages ($push + $each), so each write is
+            # O(1) in the transcript length and one round trip per flush.
+            update = {}
+            if pending:
+                update["$push"] = {"transcript": {"$each": pending}}
+            if fields:
+                update["$set"] = fields
+
+            try:
+                await self.session_collection.update_one(self._session_filter, update)
+            except Exception:
+                # Keep the messages, in order, and any fields not since
+                # overwritten, for the next flush
+                self._pending_messages[:0] = pending
+                self._pending_fields = {**queued_fields, **self._pending_fields}
+                raise
+
+            logger.debug("--- Orchestrator: Saved %d message(s) to DB ---", len(pending))
+
+    async def _flush_transcript_periodically(self):
+        """
+        A long-running task that flushes queued transcript messages.
+        """
+        while True:
+            await asyncio.sleep(TRANSCRIPT_FLUSH_INTERVAL_S)
+            try:
+                await self.flush_transcript()
+            except Exception as e:
+                print(f"--- Orchestrator: Transcript flush failed, will retry! {e} ---")
+
+    def _append_to_history(self, message: Message):
+        """
+        Appends a single message to the recent LLM history. The oldest
+        recent line moves out to be summarized once the window is full.
+        """
+        if len(self._recent_history) == self._recent_history.maxlen:
+            self._unsummarized_history.append(self._recent_history[0])
+        self._recent_history.append(format_history_line(message.speaker, message.text))
+
+        if (
+            len(self._unsummarized_history) >= SUMMARIZE_EVERY_N_MESSAGES
+            and (self._summary_task is None or self._summary_task.done())
+        ):
+            self._summary_task = asyncio.create_task(self._resummarize())
+
+    def _rolling_history(self) -> str:
+        """
+        Builds the bounded history string sent to the LLM: the rolling
+        summary, any older lines not summarized yet, then the recent messages.
+        """
+        lines = []
+        if self._summary:
+            lines.append(f"Summary of the earlier viva: {self._summary}")
+        lines.extend(self._unsummarized_history)
+        lines.extend(self._recent_history)
+        return "\n".join(lines)
+
+    async def _resummarize(self):
+        """
+        Folds the lines that fell out of the recent window into the rolling
+        summary, and queues the new summary to be saved for resuming.
+        """
+        lines = self._unsummarized_history[:]
+        try:
+            self._summary = await summarize_history(self._summary, lines)
+        except Exception as e:
+            print(f"--- Orchestrator: Summarizing history failed, will retry! {e} ---")
+            return
+
+        # New lines may have been added while we were waiting on the LLM
+        del self._unsummarized_history[:len(lines)]
+        self._summarized_count += len(lines)
+        self._pending_fields.update(
+            summary=self._summary,
+            summarized_message_count=self._summarized_count
+        )
 
     async def disconnect(self):
         """
         Cleans up all services and marks the session as completed.
         """
+        if self._asr_forwarder_task:
+            self._asr_forwarder_task.cancel()
+            self._asr_forwarder_task = None
+
+        if self._summary_task:
+            self._summary_task.cancel()
+            self._summary_task = None
+
         if self.asr_service:
             await self.asr_service.close()
 
+        if self.tts_service:
+            await self.tts_service.close()
+
+        # Stop the periodic flush. Holding the lock guarantees we don't
+        # cancel it in the middle of a write.
+        if self._flush_task:
+            async with self._flush_lock:
+                self._flush_task.cancel()
+            self._flush_task = None
+
         # ✅ FIX: Motor collection cannot be truth-tested
         if self.session_collection is not None:
-            await self.session_collection.update_one(
-                {"_id": ObjectId(self.session_id)},
-                {"$set": {"status": "completed"}}
-            )
+            # Write whatever is still queued and close the session in one update
+            await self.flush_transcript(set_fields={"status": "completed"})
 
         print(f"--- Orchestrator: Session {self.session_id} disconnected. ---")
@@ -2,19 +2,30 @@
 
 import asyncio
 import base64
+import logging
 from sarvamai import AsyncSarvamAI
 from app.config import settings
 from typing import Callable, Awaitable
 
+logger = logging.getLogger(__name__)
+
 TranscriptCallback = Callable[[str], Awaitable[None]]
 
+# Initialize the client once, at the module level (like the TTS service), so
+# its connection pools are shared across sessions. Each connect() call still
+# opens its own streaming WebSocket, so no per-session state is shared.
+client = AsyncSarvamAI(api_subscription_key=settings.SARVAM_API_KEY)
+
 class SarvamASRService:
     def __init__(self, on_transcript: TranscriptCallback):
-        self.client = AsyncSarvamAI(api_subscription_key=settings.SARVAM_API_KEY)
+        self.client = client
         self.on_transcript = on_transcript
         self.ws = None
         self._listener_task = None
         self._is_connected = False
+        # Set once a failed send has been logged at WARNING/ERROR, so a dead
+        # connection doesn't log again for every ~20 ms audio chunk
+        self._send_failure_logged = False
         
         # We will configure these in the connect() call
         self.input_audio_codec = "pcm" # We are sending raw PCM (L16)
@@ -40,6 +51,7 @@ class SarvamASRService:
             self.ws = await self.ws_context_manager.__aenter__()
             
             self._is_connected = True
+            self._send_failure_logged = False
             print(f"--- ASR Service: Connected to Sarvam (codec: {self.input_audio_codec}, rate: {self.sample_rate}) ---")
             
             self._listener_task = asyncio.create_task(self._listen())
@@ -60,14 +72,14 @@ class SarvamASRService:
         try:
             async for message in self.ws:
                 if message.type == "speech_start":
-                    print("--- ASR Service: Speech detected ---")
+                    logger.debug("--- ASR Service: Speech detected ---")
                 
                 elif message.type == "speech_end":
-                    print("--- ASR Service: Speech ended ---")
+                    logger.debug("--- ASR Service: Speech ended ---")
                 
                 elif message.type == "transcript":
                     if message.text:
-                        print(f"--- ASR Service: Transcript received: '{message.text}' ---")
+                        logger.debug("--- ASR Service: Transcript received: '%s' ---", message.text)
                         await self.on_transcript(message.text)
                         
         except Exception as e:
@@ -80,22 +92,38 @@ class SarvamASRService:
         The 'audio_chunk' is raw L16 PCM data from the client.
         """
         if not self._is_connected or not self.ws:
-            print("--- ASR Service: Cannot send, not connected. ---")
+            self._log_send_failure(logging.WARNING, "--- ASR Service: Cannot send, not connected. ---")
             return
 
         try:
-            # Sarvam's SDK expects a base64 encoded string
-            encoded_audio = base64.b64encode(audio_chunk).decode("utf-8")
+            # Sarvam's streaming API is JSON-based, so the SDK only accepts
+            # audio as a base64 *string* (no raw binary frames). base64 output
+            # is pure ASCII, so decode with the cheaper ASCII codec.
+            encoded_audio = base64.b64encode(audio_chunk).decode("ascii")
             
-            print(f"--- ASR Service: Sending {len(audio_chunk)} bytes (as {len(encoded_audio)} base64) to Sarvam ---")
+            logger.debug(
+                "--- ASR Service: Sending %d bytes (as %d base64) to Sarvam ---",
+                len(audio_chunk), len(encoded_audio)
+            )
             
             await self.ws.transcribe(
                 audio=encoded_audio,
                 encoding="pcm", # This should match our codec
                 sample_rate=self.sample_rate
             )
+            self._send_failure_logged = False
         except Exception as e:
-            print(f"--- ASR Service: Error sending audio! {e} ---")
+            self._log_send_failure(logging.ERROR, "--- ASR Service: Error sending audio! %s ---", e)
+
+    def _log_send_failure(self, level: int, msg: str, *args):
+        """
+        Logs a failed send at 'level' the first time after the connection
+        was last working, and only at DEBUG after that.
+        """
+        if self._send_failure_logged:
+            level = logging.DEBUG
+        self._send_failure_logged = True
+        logger.log(level, msg, *args)
 
     async def close(self):
         """
@@ -1,61 +1,170 @@
 import asyncio
-import base64
+import binascii
+import logging
 from sarvamai import AsyncSarvamAI, AudioOutput
 from app.config import settings
-from typing import AsyncGenerator
+from typing import AsyncGenerator, AsyncIterable
+
+logger = logging.getLogger(__name__)
+
+# Sarvam closes an idle TTS socket after one minute, so we ping well
+# within that while the session waits for the student's answer
+KEEPALIVE_INTERVAL_S = 30
 
 # Initialize the client once, at the module level
 client = AsyncSarvamAI(api_subscription_key=settings.SARVAM_API_KEY)
 
-async def text_to_audio_stream(
-    text: str, 
-    language_code: str = "en-IN", 
-    speaker: str = "anushka"
-) -> AsyncGenerator[bytes, None]:
+class SarvamTTSService:
     """
-    This is a stateless async generator.
-    It takes text and yields a stream of audio chunks (bytes).
+    A persistent text-to-speech connection for a single viva session.
+    The Sarvam WebSocket is opened and configured once, then reused for
+    every AI turn, so turns don't pay a TLS handshake + WS upgrade each.
     """
-    print(f"--- TTS Service: Generating audio for: '{text[:30]}...' ---")
-    
-    # --- FIX: Use 'async with' to correctly handle the context manager ---
-    try:
-        async with client.text_to_speech_streaming.connect(
-            model="bulbul:v2",
-            send_completion_event=True # Ask for the "final" event
-        ) as ws:
-
-            # 2. Configure the voice
-            await ws.configure(
-                target_language_code=language_code,
-                speaker=speaker,
+
+    def __init__(self, language_code: str = "en-IN", speaker: str = "anushka"):
+        self.client = client
+        self.language_code = language_code
+        self.speaker = speaker
+        self.ws = None
+        self.ws_context_manager = None
+        self._keepalive_task = None
+
+        # Only one utterance may use the connection at a time
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        try:
+            # We manually enter the context (like the ASR service) so the
+            # connection outlives a single utterance
+            self.ws_context_manager = self.client.text_to_speech_streaming.connect(
+                model="bulbul:v2",
+                send_completion_event=True # Ask for the "final" event
+            )
+            self.ws = await self.ws_context_manager.__aenter__()
+
+            # Configure the voice once for the whole session
+            await self.ws.configure(
+                target_language_code=self.language_code,
+                speaker=self.speaker,
                 output_audio_codec="mp3" # Requesting MP3 output
             )
+            self._keepalive_task = asyncio.create_task(self._keepalive())
+            logger.info("--- TTS Service: Connected to Sarvam ---")
+        except Exception as e:
+            logger.error("--- TTS Service: Connection failed! %s ---", e)
+            await self.close()
+            raise
+
+    async def text_to_audio_stream(
+        self,
+        texts: AsyncIterable[str]
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Takes text fragments (e.g. sentences, as the LLM produces them) and
+        yields a stream of audio chunks (bytes) over the persistent connection.
+        Reconnects first if a previous utterance left the connection unusable.
+        """
+        async with self._lock:
+            finished = False
+            try:
+                if self.ws is None:
+                    await self.connect()
+
+                async for text in texts:
+                    logger.debug("--- TTS Service: Generating audio for: '%.30s...' ---", text)
+
+                    yielded_audio = False
+                    try:
+                        async for audio_chunk in self._convert_fragment(text):
+                            yielded_audio = True
+                            yield audio_chunk
+                    except Exception as e:
+                        # The socket may have gone stale (e.g. closed by Sarvam
+                        # despite the keepalive). If none of this fragment has
+                        # been played yet, reconnect and retry it once.
+                        if yielded_audio:
+                            raise
+                        logger.warning("--- TTS Service: Fragment failed, reconnecting! %s ---", e)
+                        await self.close()
+                        await self.connect()
+                        async for audio_chunk in self._convert_fragment(text):
+                            yield audio_chunk
+
+                finished = True
+
+            except Exception as e:
+                logger.error("--- TTS Service: Error! %s ---", e)
+                # In a real app, we might yield a pre-recorded "error" audio chunk
+
+            finally:
+                # If we stopped mid-utterance (error or cancellation), unread
+                # audio may still arrive on this socket. Drop the connection
+                # so the next utterance starts clean on a fresh one.
+                if not finished:
+                    await self.close()
+                logger.debug("--- TTS Service: Stream finished. ---")
+
+    async def _convert_fragment(self, text: str) -> AsyncGenerator[bytes, None]:
+        """
+        Converts a single text fragment and yields its audio chunks,
+        until Sarvam's 'final' event for that fragment.
+        """
+        # 1. Send the text to be converted.
+        # convert() and flush() are one-way WebSocket sends (no
+        # RTT each), and Sarvam needs them in this order, so they
+        # stay sequential rather than being gathered.
+        await self.ws.convert(text)
+
+        # 2. Tell Sarvam we're done sending this fragment
+        await self.ws.flush()
+
+        # 3. Stream the audio chunks back to the caller
+        # This loop will receive audio as it's generated
+        async for message in self.ws:
+            if isinstance(message, AudioOutput):
+                # Decode the base64 audio and yield the raw bytes.
+                # binascii is the C routine b64decode wraps, minus
+                # its altchars/validate argument handling.
+                yield binascii.a2b_base64(message.data.audio)
+
+            # The 'final' event tells us this fragment is 100% done
+            elif message.type == "events" and message.data.event_type == "final":
+                logger.debug("--- TTS Service: Received 'final' audio event. ---")
+                return
+
+        # The socket closed without finishing this fragment
+        raise ConnectionError("TTS connection closed before the 'final' event")
+
+    async def _keepalive(self):
+        """
+        A long-running task that pings the idle socket so Sarvam doesn't
+        close it while the student is answering. Pings are skipped while
+        an utterance is using the connection.
+        """
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL_S)
+            if self.ws is None or self._lock.locked():
+                continue
+            try:
+                await self.ws.ping()
+            except Exception as e:
+                # The next utterance will reconnect and retry
+                logger.warning("--- TTS Service: Keepalive ping failed! %s ---", e)
+
+    async def close(self):
+        """
+        Shuts down the WebSocket connection.
+        """
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+        self._keepalive_task = None
+
+        if self.ws_context_manager:
+            context_manager, self.ws_context_manager = self.ws_context_manager, None
+            try:
+                await context_manager.__aexit__(None, None, None)
+            except Exception as e:
+                logger.error("--- TTS Service: Error closing connection! %s ---", e)
 
-            # 3. Send the text to be converted
-            await ws.convert(text)
-
-            # 4. Tell Sarvam we're done sending text
-            await ws.flush()
-
-            # 5. Stream the audio chunks back to the caller
-            # This loop will receive audio as it's generated
-            async for message in ws:
-                if isinstance(message, AudioOutput):
-                    # Decode the base64 audio and yield the raw bytes
-                    audio_chunk = base64.b64decode(message.data.audio)
-                    yield audio_chunk
-                
-                # The 'final' event tells us the stream is 100% done
-                elif message.type == "events" and message.data.event_type == "final":
-                    print("--- TTS Service: Received 'final' audio event. ---")
-                    break
-
-    except Exception as e:
-        print(f"--- TTS Service: Error! {e} ---")
-        # In a real app, we might yield a pre-recorded "error" audio chunk
-    
-    finally:
-        # 'async with' handles closing the connection,
-        # so we just add a final log.
-        print("--- TTS Service: Stream finished and connection closed. ---")
\ No newline at end of file
+        self.ws = None
+        logger.info("--- TTS Service: Connection closed. ---")
@@ -9,6 +9,12 @@ from app.db.database import get_db
 from app.db.models import VivaSession
 # from app.auth import User # <-- REMOVED
 
+# Number of sessions fetched per cursor round trip in the history query
+HISTORY_BATCH_SIZE = 100
+
+# Maximum number of (most recent) sessions returned by the history query
+HISTORY_LIMIT = 50
+
 class SessionService:
     """
     Handles the business logic for creating and retrieving viva sessions.
@@ -36,13 +42,14 @@ class SessionService:
             student_name=student_name, # <-- MODIFIED
             topic=topic,
             class_level=class_level,
-            status="active",
-            transcript=[]
+            status="active"
         )
         
         # 2. Insert into MongoDB
+        # exclude_none leaves 'transcript' out entirely, so the first $push
+        # creates the array (a $push onto a null field would fail).
         result = await self.collection.insert_one(
-            new_session.model_dump(by_alias=True, exclude={'id'})
+            new_session.model_dump(by_alias=True, exclude={'id'}, exclude_none=True)
         )
         
         if not result.inserted_id:
@@ -56,25 +63,38 @@ class SessionService:
 
     async def get_viva_history_for_user(self, student_name: str) -> List[VivaSession]: # <-- MODIFIED
         """
-        Retrieves all past viva sessions for a given student.
+        Retrieves the most recent past viva sessions for a given student,
+        newest first.
         """
         print(f"--- Session Service: Fetching history for {student_name} ---") # <-- MODIFIED
         
-        sessions = []
-        # Find sessions matching the student_name
-        cursor = self.collection.find({"student_name": student_name}) # <-- MODIFIED
+        # Find sessions matching the student_name, newest first (_id order,
+        # served by the (student_name, _id) index).
+        # The history list doesn't need the (potentially long) transcripts
+        # or the orchestrator's resume state, so we project them out and
+        # fetch in explicit batches.
+        cursor = self.collection.find(
+            {"student_name": student_name},
+            projection={"transcript": 0, "summary": 0, "summarized_message_count": 0}
+        ).sort("_id", -1).limit(HISTORY_LIMIT).batch_size(HISTORY_BATCH_SIZE)
         
-        async for session_data in cursor:
-            sessions.append(VivaSession.model_validate(session_data))
-            
-        return sessions
+        # Fetch all (at most HISTORY_LIMIT) documents in one go, rather than
+        # awaiting the cursor once per document
+        raw_sessions = await cursor.to_list(length=HISTORY_LIMIT)
+        return [VivaSession.model_validate(session_data) for session_data in raw_sessions]
 
 # --- FastAPI Dependency ---
 
+# SessionService is stateless and the Motor database handle is safe to share
+# across coroutines, so a single instance is reused for every request.
+_session_service: SessionService | None = None
+
 async def get_session_service() -> SessionService:
     """
     FastAPI dependency to inject a SessionService instance
     with a database connection.
     """
-    db = await get_db()
-    return SessionService(db)
\ No newline at end of file
+    global _session_service
+    if _session_service is None:
+        _session_service = SessionService(await get_db())
+    return _session_service